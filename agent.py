@@ -1,22 +1,428 @@
-import sys
+import atexit
+import hashlib
+import json
+import os
+import pickle
+import tempfile
 from abc import ABC, abstractmethod
-from collections import defaultdict
-from numpy import mean
-from random import choice, sample, shuffle
-from tqdm import tqdm
-from util import *
-from queue import Queue
+import numpy as np
+from numba import njit, prange
+from random import shuffle
+
+
+NUM_PATTERNS = 3 ** 5
+NO_SCORE = np.iinfo(np.int64).max
+SOLVED_CODE = NUM_PATTERNS - 1
+CACHE_DIR = os.environ.get("WORDLEAGENT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "wordleagent"))
+# Bump whenever guess selection changes, so guesses (including the first) cached by earlier versions are ignored
+CACHE_VERSION = 2
+FEEDBACK_CODES = {"gray": 0, "yellow": 1, "green": 2}
+GUESS_CACHES = dict()
 
 
 def initialize_agent(allowed, possible):
     #return RandomAgent(allowed, possible)
     return MyWordleAgent(allowed, possible)
 
+def encode_feedback(feedback):
+    """
+    Pack a feedback list into a single base-3 pattern code
+
+    Keyword arguments:
+    feedback -- list of colors ("green", "yellow", "gray"), one per letter of the guess
+
+    Returns:
+    The code sum(c * 3**p) where c is 2 for green, 1 for yellow and 0 for gray
+    """
+    return sum(FEEDBACK_CODES[color] * 3 ** pos for pos, color in enumerate(feedback))
+
+def words_key(allowed, possible):
+    """
+    Digest identifying a pair of word lists, used to name on-disk caches
+
+    Keyword arguments:
+    allowed -- the list of allowable guesses
+    possible -- the list of possible answers
+    """
+    return hashlib.sha1(("\n".join(allowed) + "\n\n" + "\n".join(possible)).encode()).hexdigest()
+
+def encode_words(words, alphabet):
+    """
+    Pack a list of five-letter words into an array of letter indices
+
+    Keyword arguments:
+    words -- list of five-letter words
+    alphabet -- sorted list of every letter the words use
+
+    Returns:
+    A uint8 array of shape (len(words), 5) whose entry [i, p] is the index in alphabet
+    of letter p of words[i]
+    """
+    letter_index = {letter: index for index, letter in enumerate(alphabet)}
+    return np.array([[letter_index[letter] for letter in word] for word in words], dtype=np.uint8).reshape(-1, 5)
+
+@njit(parallel=True, cache=True)
+def build_patterns(guesses, answers, n_letters, out):
+    """
+    Fill out[j, i] with the encoded feedback of guess i against answer j
+
+    The letter counts of each answer are computed once and shared by every guess;
+    letters a guess consumes are handed back afterwards so the counts stay intact.
+
+    Keyword arguments:
+    guesses -- letter index array of shape (n_guesses, 5)
+    answers -- letter index array of shape (n_answers, 5)
+    n_letters -- size of the alphabet the letter indices are drawn from
+    out -- uint8 array of shape (n_answers, n_guesses) to write into
+    """
+    for j in prange(answers.shape[0]):
+        counts = np.zeros(n_letters, np.int8)
+        for pos in range(5):
+            counts[answers[j, pos]] += 1
+        for i in range(guesses.shape[0]):
+            code = 0
+            taken = 0
+            power = 1
+            for pos in range(5):
+                if guesses[i, pos] == answers[j, pos]:
+                    code += 2 * power
+                    counts[guesses[i, pos]] -= 1
+                    taken |= 1 << pos
+                power *= 3
+            power = 1
+            for pos in range(5):
+                letter = guesses[i, pos]
+                if not taken & (1 << pos) and counts[letter] > 0:
+                    code += power
+                    counts[letter] -= 1
+                    taken |= 1 << pos
+                power *= 3
+            for pos in range(5):
+                if taken & (1 << pos): counts[guesses[i, pos]] += 1
+            out[j, i] = code
+
+def precompute_patterns(guesses, answers, n_letters):
+    """
+    Build the feedback table of every guess against every answer
+
+    Keyword arguments:
+    guesses -- letter index array of the guesses, as returned by encode_words
+    answers -- letter index array of the answers, as returned by encode_words
+    n_letters -- size of the alphabet the words were encoded with
+
+    Returns:
+    A uint8 array of shape (len(guesses), len(answers)) whose entry [i, j] is the
+    encoded feedback of guessing guesses[i] when the answer is answers[j]
+    """
+    by_answer = np.empty((len(answers), len(guesses)), dtype=np.uint8)
+    build_patterns(guesses, answers, n_letters, by_answer)
+    return np.ascontiguousarray(by_answer.T)
+
+@njit(cache=True)
+def score_with_cutoff(codes, cutoff):
+    """
+    Sum of squared bucket sizes of the partition of the pool by one guess's feedback
+
+    The score is accumulated while counting, since adding an answer to a bucket of
+    size c raises it by 2c + 1, so counting stops as soon as the partial score reaches
+    the cutoff.
+
+    Keyword arguments:
+    codes -- feedback codes of the guess against each answer still in the pool
+    cutoff -- score to beat
+
+    Returns:
+    The score, or NO_SCORE if it is not below cutoff
+    """
+    counts = np.zeros(NUM_PATTERNS, np.int64)
+    score = 0
+    for code in codes:
+        score += 2 * counts[code] + 1
+        if score >= cutoff: return NO_SCORE
+        counts[code] += 1
+    return score
+
+def gather(patterns, pool_idx):
+    """
+    Copy the pool's columns of the feedback table into a compact array
+
+    Scoring then streams short contiguous rows instead of gathering from the full
+    table once per candidate; deep into a game the copy is small enough to stay in cache.
+    Compiled twice below: serially as gather_pool, and across all cores as
+    gather_pool_parallel, which is worth it only for large pools.
+
+    Keyword arguments:
+    patterns -- the feedback table
+    pool_idx -- indices of the answers still in the pool
+
+    Returns:
+    A uint8 array of shape (patterns.shape[0], len(pool_idx))
+    """
+    pool_patterns = np.empty((patterns.shape[0], len(pool_idx)), np.uint8)
+    for i in prange(patterns.shape[0]):
+        for j in range(len(pool_idx)):
+            pool_patterns[i, j] = patterns[i, pool_idx[j]]
+    return pool_patterns
+
+# Numba names cache files after the Python function and not the parallel flag, so only
+# one of the two compilations of gather can be cached; kernels calling the other still are
+gather_pool = njit(cache=True)(gather)
+gather_pool_parallel = njit(parallel=True)(gather)
+
+@njit(cache=True)
+def best_guess_row(patterns, pool_idx, order):
+    """
+    Find the guess whose feedback best partitions the pool
+
+    Candidates are scored one at a time against the best score so far, and each
+    stops being counted as soon as its partial score reaches it.
+
+    Keyword arguments:
+    patterns -- the feedback table
+    pool_idx -- indices of the answers still in the pool
+    order -- rows of patterns to score; ties go to the earliest
+
+    Returns:
+    The row of patterns with the lowest sum of squared bucket sizes
+    """
+    pool_patterns = gather_pool(patterns, pool_idx)
+    best_row = order[0]
+    best_score = NO_SCORE
+    for row in order:
+        score = score_with_cutoff(pool_patterns[row], best_score)
+        if score < best_score:
+            best_row = row
+            best_score = score
+    return best_row
+
+@njit(parallel=True, cache=True)
+def best_guess_row_parallel(patterns, pool_idx, order):
+    """
+    Find the guess whose feedback best partitions the pool, scoring candidates
+    across all cores
+
+    Keyword arguments:
+    patterns -- the feedback table
+    pool_idx -- indices of the answers still in the pool
+    order -- rows of patterns to score; ties go to the earliest
+
+    Returns:
+    The row of patterns with the lowest sum of squared bucket sizes
+    """
+    pool_patterns = gather_pool_parallel(patterns, pool_idx)
+    scores = np.empty(len(order), np.int64)
+    for k in prange(len(order)):
+        scores[k] = score_with_cutoff(pool_patterns[order[k]], NO_SCORE)
+    return order[scores.argmin()]
+
+@njit(cache=True)
+def bucket_score(pool_patterns, order, members, cutoff):
+    """
+    Best single-guess score on a bucket of the pool
+
+    A guess scores the sum of squared sizes of the sub-buckets it splits the bucket
+    into, minus one if the guess is itself a member, crediting the answer it solves.
+    For example, a non-member splitting three answers into sub-buckets of two and one
+    scores 5; a member splitting them into three singletons scores 2.
+
+    Keyword arguments:
+    pool_patterns -- the feedback table restricted to the pool's columns
+    order -- rows of pool_patterns to try
+    members -- columns of pool_patterns that make up the bucket
+    cutoff -- score to beat
+
+    Returns:
+    The lowest score any row achieves on members, or cutoff if none goes below it
+    """
+    n_members = len(members)
+    if n_members <= 2: return n_members - 1
+    codes = np.empty(n_members, np.uint8)
+    best_score = cutoff
+    for row in order:
+        solved = 0
+        for k in range(n_members):
+            codes[k] = pool_patterns[row, members[k]]
+            if codes[k] == SOLVED_CODE: solved = 1
+        score = score_with_cutoff(codes, best_score + 1 if best_score < NO_SCORE else best_score)
+        if score == NO_SCORE: continue
+        score -= solved
+        if score < best_score:
+            best_score = score
+            if best_score == n_members - 1: break
+    return best_score
+
+@njit(cache=True)
+def depth2_best_row(patterns, pool_idx, order):
+    """
+    Find the guess with the lowest score when followed by the best guess in each
+    resulting bucket
+
+    A guess is scored by summing bucket_score over the buckets it splits the pool
+    into, minus one if the guess is itself in the pool, since that answer is solved
+    this turn. Both levels thus use the same objective: sums of squared (sub-)bucket
+    sizes, less one for each guess that is itself a possible answer. A bucket scores
+    at least its size minus one, so a guess is dropped as soon as its partial score
+    plus that bound over its unscored buckets reaches the best score so far.
+
+    Keyword arguments:
+    patterns -- the feedback table
+    pool_idx -- indices of the answers still in the pool
+    order -- rows of patterns to score; ties go to the earliest
+
+    Returns:
+    The row of patterns with the lowest two-guess score
+    """
+    pool_patterns = gather_pool(patterns, pool_idx)
+    n_pool = len(pool_idx)
+    # Best-first on this pool rather than the full one: a tight bound early prunes most
+    # candidates, and bucket_score reaches a perfect split sooner
+    pool_scores = np.empty(len(order), np.int64)
+    for k in range(len(order)):
+        pool_scores[k] = score_with_cutoff(pool_patterns[order[k]], NO_SCORE)
+    order = order[np.argsort(pool_scores, kind="mergesort")]
+    best_row = order[0]
+    best_score = NO_SCORE
+    for row in order:
+        if best_score == -1: break
+        codes = pool_patterns[row]
+        by_code = np.argsort(codes, kind="mergesort")
+        counts = np.bincount(codes, minlength=NUM_PATTERNS)
+        bound = 0
+        for code in range(SOLVED_CODE):
+            if counts[code] > 0: bound += counts[code] - 1
+        score = -1 if counts[SOLVED_CODE] > 0 else 0
+        start = 0
+        while start < n_pool and score + bound < best_score:
+            code = codes[by_code[start]]
+            end = start + counts[code]
+            if code != SOLVED_CODE:
+                bound -= counts[code] - 1
+                cutoff = best_score - score - bound if best_score < NO_SCORE else NO_SCORE
+                score += bucket_score(pool_patterns, order, by_code[start:end], cutoff)
+            start = end
+        if score + bound < best_score:
+            best_row = row
+            best_score = score
+    return best_row
+
+def write_atomic(path, dump):
+    """
+    Write a cache file so readers never see it half written
+
+    The data goes to a temporary file in CACHE_DIR that then replaces path, so a run
+    killed mid-write, or two runs saving at once, leave either the old or a whole new file.
+
+    Keyword arguments:
+    path -- file to write
+    dump -- function that writes the data to a binary file object
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as writer:
+            dump(writer)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def load_patterns(key, guesses, answers, n_letters):
+    """
+    Load the feedback table from the on-disk cache, building and saving it on a miss
+
+    Keyword arguments:
+    key -- words_key of the word lists guesses and answers were encoded from
+    guesses -- letter index array of the guesses
+    answers -- letter index array of the answers
+    n_letters -- size of the alphabet the words were encoded with
+
+    Returns:
+    The feedback table produced by precompute_patterns
+    """
+    path = os.path.join(CACHE_DIR, f"{key}.patterns.npy")
+    if os.path.exists(path):
+        try:
+            return np.load(path)
+        except (EOFError, ValueError):
+            pass
+    patterns = precompute_patterns(guesses, answers, n_letters)
+    write_atomic(path, lambda writer: np.save(writer, patterns))
+    return patterns
+
+def read_guess_cache(path):
+    """
+    Read a cache of optimal guesses saved by a previous run
+
+    Keyword arguments:
+    path -- file the cache was saved to
+
+    Returns:
+    The saved cache, or an empty one if none has been saved or the file is unreadable
+    """
+    if not os.path.exists(path): return dict()
+    try:
+        with open(path, "rb") as reader:
+            return pickle.load(reader)
+    except (EOFError, pickle.UnpicklingError, ValueError):
+        return dict()
+
+def load_guess_cache(path):
+    """
+    Get the cache of optimal guesses for a cache file, reading it on first use
+
+    Agents on the same word lists share one cache, so no agent's entries are lost
+    when the caches are saved.
+
+    Keyword arguments:
+    path -- file the cache is saved to
+    """
+    if path not in GUESS_CACHES: GUESS_CACHES[path] = read_guess_cache(path)
+    return GUESS_CACHES[path]
+
+def save_guess_caches():
+    """
+    Save every cache of optimal guesses, merged into what is already on disk so
+    entries saved meanwhile by other runs are kept
+    """
+    for path, cache in GUESS_CACHES.items():
+        merged = read_guess_cache(path)
+        merged.update(cache)
+        write_atomic(path, lambda writer: pickle.dump(merged, writer))
+
+atexit.register(save_guess_caches)
+
 class WordleAgent(ABC):
 
     def __init__(self, allowed, possible):
         self.allowed = allowed
         self.possible = possible
+        allowed_set = set(self.allowed)
+        self.can_guess = self.allowed + [word for word in self.possible if word not in allowed_set]
+        self.guess_to_row = {word: row for row, word in enumerate(self.can_guess)}
+        self.alphabet = sorted(set("".join(self.can_guess)) | set("".join(self.possible)))
+        self.can_guess_u8 = encode_words(self.can_guess, self.alphabet)
+        self.possible_u8 = encode_words(self.possible, self.alphabet)
+        self.key = words_key(self.can_guess, self.possible)
+        self.patterns = load_patterns(self.key, self.can_guess_u8, self.possible_u8, len(self.alphabet))
+
+    def filter_by_pattern(self, guess_row, code, pool_idx):
+        """Filters a pool of possible answers based on feedback from a guess.
+
+        Parameters
+        ----------
+        guess_row : int
+            The row of the guess in the feedback table, as given by guess_to_row
+        code : int
+            The feedback from the guess, as encoded by encode_feedback
+        pool_idx : np.ndarray[int32]
+            Indices into possible of the original pool of answers
+
+        Returns
+        -------
+        np.ndarray[int32]
+            The indices of the answers in the pool that remain possible after making the guess.
+        """
+        return pool_idx[self.patterns[guess_row, pool_idx] == code]
 
     @abstractmethod
     def first_guess(self):
@@ -92,109 +498,58 @@ class RandomAgent(WordleAgent):
 
     def __init__(self, allowed, possible):
         super().__init__(allowed, possible)
-        self.pool = self.possible
+        self.pool_idx = np.arange(len(self.possible), dtype=np.int32)
 
     def first_guess(self):
-        self.pool = self.possible
-        shuffle(self.pool)
+        self.pool_idx = np.arange(len(self.possible), dtype=np.int32)
         return self.next_guess()
 
     def next_guess(self):
-        shuffle(self.pool)
-        return self.pool[0]
+        shuffle(self.pool_idx)
+        return self.possible[self.pool_idx[0]]
 
     def report_feedback(self, guess, feedback):
-        self.pool = filter_possible_words(guess, feedback, self.pool)
-        print(self.pool)
-        print(len(self.pool))
-
-class Tree():
-    """
-    A class to represent an expectimax tree. Tree has depth 5 and branching factor of 3.
-    The leftwards node at level one of the tree are all words in pool with same first letter
-    as the word stored in the root node. The middle node at this level is all words that have
-    the first letter of the root node word appear somewhere that isn't their first letter. The 
-    rightwards node is then all other words. The leftwards node at level two is all words with 
-    the same first two letters as the root node word. Observe this pattern continues and is
-    illustrated below to level 2 (obviously extends further):
-    
-    guess --- green ------------------- green, green ---- ...
-          |                          |                                               
-          |                          |-- green, yellow --- ...
-          |                          |
-          |                          |-- green, grey --- ...
-          |                         
-          |-- yellow-------------------- yellow, green --- ...  
-          |                          |                         
-          |                          |-- yellow, yellow --- ...
-          |                          |
-          |                          |-- yellow, grey --- ...                  
-          |                          
-          |-- grey-------------------- grey, green --- ...  
-                                     |                         
-                                     |-- grey, yellow --- ...
-                                     |
-                                     |-- grey, grey --- ... 
-
-    Attributes:
-    val -- str
-        root word of tree
-    rootNode -- Node
-        root node of tree
-    """
-    def __init__(self, word, pool):
-        """
-        Initialize Tree
-
-        Keyword arguments:
-        word -- root node word the tree will be built around
-        pool -- pool of words that will compose tree
-        """
-        self.val = word
-        self.root_node = Node(pool)
-
-class Node():
-    """
-    A class to represent a node used in Tree class
-    
-    Attributes:
-    pool -- list[str]
-        pool of possible words at this node
-    green -- Node
-        child node of this node, words in the pool of green have green feedback at current position
-    yellow -- Node
-        child node of this node, words in the pool of green have yellow feedback at current position
-    grey -- Node
-        child node of this node, words in the pool of green have grey feedback at current position
-    """
-    def __init__(self, pool):
-        """
-        Initialize Node
-
-        Keyword arguments:
-        pool -- pool of words stored in this node
-        """
-        self.pool = pool
-        self.green = None
-        self.yellow = None
-        self.grey = None
+        self.pool_idx = self.filter_by_pattern(self.guess_to_row[guess], encode_feedback(feedback), self.pool_idx)
+        print([self.possible[col] for col in self.pool_idx])
+        print(len(self.pool_idx))
 
 class MyWordleAgent(WordleAgent):
     """
-    A class to represent a search-based Wordle AI agent. Class uses caching and the expectimax search
-    algorithm to determine the best guess at every stage of a wordle game.
+    A class to represent a search-based Wordle AI agent. Class uses caching and a precomputed
+    feedback table to pick, at every stage of a wordle game, the guess that minimizes the
+    expected number of answers remaining.
     
     Attributes:
-    pool -- list[str]
-        pool of possible wordle answers
-    canGuess -- list[str]
-        pool of possible wordle guesses
-    cache -- dictionary(str : str)
-        stores strings of feedback patterns and their optimal associated guess
-    feedbackSoFar -- str
-        string of feedback received so far in current wordle game
+    pool_idx -- np.ndarray[int32]
+        indices into possible of the answers still consistent with the feedback so far
+    can_guess -- list[str]
+        pool of possible wordle guesses, allowed followed by any possible answers missing from it
+    alphabet -- list[str]
+        sorted letters used by can_guess and possible
+    can_guess_u8 -- np.ndarray[uint8]
+        can_guess as an (n, 5) array of indices into alphabet
+    possible_u8 -- np.ndarray[uint8]
+        possible as an (n, 5) array of indices into alphabet
+    guess_to_row -- dictionary(str : int)
+        row of each guessable word in patterns
+    patterns -- np.ndarray[uint8]
+        feedback code of every (guessable word, possible answer) pair
+    order -- np.ndarray[int]
+        rows of patterns in the order find_guess tries them, best first against the full pool
+    cache -- dictionary(bytes : str)
+        stores surviving pools (as the bytes of pool_idx) and their optimal associated guess,
+        shared by every agent on the same word lists and persisted to disk between runs
+    cache_path -- str
+        file the cache is loaded from and saved to
+    feedback_codes -- bytes
+        guesses and feedback so far in the current game, five bytes per turn (guess row,
+        then feedback code)
+    history_cache -- dictionary(bytes : str)
+        stores feedback_codes of games played so far and their optimal associated guess
     guess -- str
         the first guess to bed used in every game, has to be calculated once
+    first_guess_path -- str
+        file the first guess is loaded from and saved to
     """
 
     def __init__(self, allowed, possible):
@@ -206,11 +561,15 @@ class MyWordleAgent(WordleAgent):
         possible -- the list of possible answers
         """
         super().__init__(allowed, possible)
-        self.pool = self.possible
-        self.can_guess = self.allowed
-        self.cache = dict()
-        self.feedback_so_far = None
-        self.guess = None
+        self.pool_idx = np.arange(len(self.possible), dtype=np.int32)
+        initial_scores = [score_with_cutoff(codes, NO_SCORE) for codes in self.patterns]
+        self.order = np.argsort(initial_scores, kind="stable")
+        self.cache_path = os.path.join(CACHE_DIR, f"{self.key}.v{CACHE_VERSION}.cache.pkl")
+        self.cache = load_guess_cache(self.cache_path)
+        self.feedback_codes = b""
+        self.history_cache = dict()
+        self.first_guess_path = os.path.join(CACHE_DIR, f"{self.key}.v{CACHE_VERSION}.first_guess.json")
+        self.guess = self.load_first_guess()
         
     def first_guess(self):
         """
@@ -219,24 +578,31 @@ class MyWordleAgent(WordleAgent):
         Returns:
         Optimal first guess
         """
-        self.pool = self.possible
-        self.can_guess = self.allowed
-        self.feedback_so_far = ""
-        if self.guess is None: self.guess = self.find_guess().val
+        self.pool_idx = np.arange(len(self.possible), dtype=np.int32)
+        self.feedback_codes = b""
+        if self.guess is None:
+            self.guess = self.find_guess()
+            self.save_first_guess()
         return self.guess
     
     def next_guess(self):
         """
-        Method to get the optimal next guess in a game of wordle
+        Method to get the optimal next guess in a game of wordle. With three answers
+        left, guesses the one that best splits the other two, if any does.
 
         Returns:
         Optimal next guess
         """
-        GUESS_RANDOM_POOL_SIZE = 3
-
-        if len(self.pool) <= GUESS_RANDOM_POOL_SIZE: return self.pool[0]
-        if self.feedback_so_far in self.cache: return self.cache.get(self.feedback_so_far)
-        return self.find_guess().val
+        GUESS_FIRST_POOL_SIZE = 2
+        GUESS_SPLIT_POOL_SIZE = 3
+
+        pool_size = len(self.pool_idx)
+        if pool_size <= GUESS_FIRST_POOL_SIZE: return self.possible[self.pool_idx[0]]
+        if pool_size == GUESS_SPLIT_POOL_SIZE:
+            rows = [self.guess_to_row[self.possible[col]] for col in self.pool_idx]
+            scores = [score_with_cutoff(self.patterns[row, self.pool_idx], NO_SCORE) for row in rows]
+            return self.can_guess[rows[int(np.argmin(scores))]]
+        return self.find_guess()
     
     def report_feedback(self, guess, feedback):
         """
@@ -246,91 +612,72 @@ class MyWordleAgent(WordleAgent):
         guess -- the guess used
         feedback -- feedback from the guess used
         """
-        self.pool = filter_possible_words(guess, feedback, self.pool)
-        self.feedback_so_far += ''.join(feedback)
-    
-    def find_guess(self):
-        """
-        Helper method to find optimal guess in cases where optimal guess is not 
-        cached or first guess undetermined. Builds expectimax trees for every 
-        guessable word.
-        
-        Returns:
-        The expectimax tree with the lowest score (least expected words remaining if guess used)
-        """
-        best_tree = None
-        best_score = float('inf')
-
-        for guess in self.can_guess:
-            cur_tree, score = self.recursive_build_tree(guess)
-            if score < best_score: 
-                best_tree = cur_tree
-                best_score = score
-
-        if len(self.feedback_so_far) != 0: self.cache.setdefault(self.feedback_so_far, best_tree.val)
-        return best_tree
+        row = self.guess_to_row[guess]
+        code = encode_feedback(feedback)
+        self.pool_idx = self.filter_by_pattern(row, code, self.pool_idx)
+        self.feedback_codes += row.to_bytes(4, "little") + bytes([code])
     
-    def recursive_build_tree(self, guess):
+    def score_guess(self, guess):
         """
-        Recursively build expectimax tree
+        Expected number of answers remaining after a guess
 
         Keyword arguments:
-        guess -- the guess used
+        guess -- the guess to score
 
         Returns:
-        A tuple of the expectimax tree and its associated score
-        """
-        tree = Tree(guess, self.pool)
-        score = self.calculate_score(guess, 0, tree.root_node)
-        return (tree, score)
-    
-    def calculate_score(self, guess, pos, node):
+        The sum of squared bucket sizes of the partition of the pool by the guess's
+        feedback, divided by the size of the pool
         """
-        Helper method to build expectimax tree reursively and calculate its score
-
-        Keyword arguments:
-        guess -- the guess used
-        pos -- position of the current letter being considered
-        node -- current tree node being considered
+        codes = self.patterns[self.guess_to_row[guess], self.pool_idx]
+        return score_with_cutoff(codes, NO_SCORE) / len(self.pool_idx)
 
+    def find_guess(self):
+        """
+        Helper method to find optimal guess in cases where optimal guess is not 
+        cached or first guess undetermined. Partitions the pool by feedback pattern
+        for every guessable word and scores each partition by the sum of its squared
+        bucket sizes (proportional to the expected number of words remaining).
+        Cached guesses are looked up by game history first, then by surviving pool.
+        
         Returns:
-        The score of the expectimax tree (expected words remaining if guess used)
+        The guess with the lowest score (least expected words remaining if guess used)
         """
-        MIN_POOL_SIZE = 1
-        LAST_POSITION = 4
-
-        pool_len = len(node.pool)
-        if pool_len <= MIN_POOL_SIZE: return 1
-        if pos > LAST_POSITION: return pool_len
-
-        green, yellow, grey = self.get_pool(guess, pos, node.pool)
-
-        node.green = Node(green)
-        node.yellow = Node(yellow)
-        node.grey = Node(grey)
-    
-        green_score = (len(node.green.pool) / pool_len) * self.calculate_score(guess, pos + 1, node.green)
-        yellow_score = (len(node.yellow.pool) / pool_len) * self.calculate_score(guess, pos + 1, node.yellow)
-        grey_score = (len(node.grey.pool) / pool_len) * self.calculate_score(guess, pos + 1, node.grey)
-
-        return green_score + yellow_score + grey_score
-
-    def get_pool(self, guess, pos, pool):
+        if self.feedback_codes in self.history_cache: return self.history_cache[self.feedback_codes]
+        key = self.pool_idx.tobytes()
+        if key in self.cache:
+            self.history_cache[self.feedback_codes] = self.cache[key]
+            return self.cache[key]
+
+        DEPTH2_POOL_SIZE = 20
+        PARALLEL_POOL_SIZE = 512
+
+        pool_size = len(self.pool_idx)
+        if pool_size < DEPTH2_POOL_SIZE: best_row = depth2_best_row(self.patterns, self.pool_idx, self.order)
+        elif pool_size > PARALLEL_POOL_SIZE: best_row = best_guess_row_parallel(self.patterns, self.pool_idx, self.order)
+        else: best_row = best_guess_row(self.patterns, self.pool_idx, self.order)
+        best_guess = self.can_guess[best_row]
+        if len(self.pool_idx) < len(self.possible):
+            self.cache[key] = best_guess
+            self.history_cache[self.feedback_codes] = best_guess
+        return best_guess
+
+    def load_first_guess(self):
         """
-        Helper method to find the three descendant pools of the current node
-
-        Keyword arguments:
-        guess -- the guess used
-        pos -- position of the current letter being considered
-        pool -- the pool of words that will be split into thruple of lists
+        Load the first guess saved by a previous run
 
         Returns:
-        A thruple ([green], [yellow], [grey]) where green is words in pool with green 
-        feedback with guess at pos, etc...
+        The saved first guess, or None if none has been saved for these word lists or
+        the saved file is unreadable
+        """
+        if not os.path.exists(self.first_guess_path): return None
+        try:
+            with open(self.first_guess_path) as reader:
+                return json.load(reader)["guess"]
+        except (KeyError, ValueError):
+            return None
+
+    def save_first_guess(self):
+        """
+        Save the first guess so later runs can skip computing it
         """
-        ret = ([], [], [])
-        for word in pool:
-            if guess[pos] == word[pos]: ret[0].append(word)
-            elif guess[pos] in word: ret[1].append(word)
-            else: ret[2].append(word)
-        return ret
+        write_atomic(self.first_guess_path, lambda writer: writer.write(json.dumps({"guess": self.guess}).encode()))
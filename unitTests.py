@@ -1,13 +1,26 @@
-from agent import initialize_agent, MyWordleAgent
+import atexit
+import os
+import shutil
+import tempfile
+
+os.environ["WORDLEAGENT_CACHE_DIR"] = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, os.environ["WORDLEAGENT_CACHE_DIR"], ignore_errors=True)
+
+from agent import initialize_agent, precompute_patterns, encode_feedback, encode_words, MyWordleAgent
+import agent
+from agent import best_guess_row, best_guess_row_parallel, bucket_score, depth2_best_row, gather_pool, NO_SCORE, SOLVED_CODE
+from util import filter_possible_words, get_feedback, read_words
+from random import Random
+import numpy as np
 import unittest
 
-class Test_recursive_build_tree(unittest.TestCase):
+class Test_score_guess(unittest.TestCase):
     def runTest(self):
         guesses = ["ebony"]
         answers = ["birch", "beech", "cedar", "ebony", "maple"]
         agent = initialize_agent(guesses, answers)
-        score = agent.recursive_build_tree(guesses[0])[1]
-        assert score == 1.40, "incorrect expectimax score"
+        score = agent.score_guess(guesses[0])
+        assert score == 1.40, "incorrect expected remaining score"
 
 class Test_first_guess(unittest.TestCase):
     def runTest(self):
@@ -16,12 +29,115 @@ class Test_first_guess(unittest.TestCase):
         first_guess = agent.first_guess()
         assert first_guess in ["birch", "beech"], "incorrect first guess"
 
-class Test_get_pool(unittest.TestCase):
+class Test_precompute_patterns(unittest.TestCase):
+    def runTest(self):
+        answers = ["birch", "beech", "cedar", "ebony", "maple"]
+        alphabet = sorted(set("".join(answers)))
+        patterns = precompute_patterns(encode_words(["beech"], alphabet), encode_words(answers, alphabet), len(alphabet))
+        assert patterns[0, 0] == encode_feedback(["green", "gray", "gray", "green", "green"]), "incorrect pattern generation"
+        assert patterns[0, 1] == encode_feedback(["green"] * 5), "incorrect pattern generation"
+        assert patterns[0, 2] == encode_feedback(["gray", "green", "gray", "yellow", "gray"]), "incorrect pattern generation"
+
+class Test_filter_by_pattern(unittest.TestCase):
     def runTest(self):
         answers = ["birch", "beech", "cedar", "ebony", "maple"]
         agent = initialize_agent(answers, answers)
-        pool = agent.get_pool(answers[0], 0, answers)
-        assert pool[0] == ["birch", "beech"] and pool[1] == ["ebony"] and pool[2] == ["cedar", "maple"], "incorrect pool generation"
+        for guess in answers:
+            for target in answers:
+                feedback = get_feedback(guess, target)
+                pool_idx = agent.filter_by_pattern(agent.guess_to_row[guess], encode_feedback(feedback), agent.pool_idx)
+                pool = [answers[col] for col in pool_idx]
+                assert pool == filter_possible_words(guess, feedback, answers), "incorrect pool filtering"
+
+def brute_bucket_score(patterns, members):
+    """Lowest sum of squared sub-bucket sizes, less one for a member guess, over every guess, by exhaustive search."""
+    best = None
+    for row in range(patterns.shape[0]):
+        codes = list(patterns[row, members])
+        score = sum(codes.count(code) ** 2 for code in set(codes)) - (SOLVED_CODE in codes)
+        if best is None or score < best: best = score
+    return best
+
+def brute_depth2_score(patterns, pool, row):
+    """Depth-2 score of a guess on pool: the best bucket score of each bucket it leaves, less one if it is in the pool."""
+    codes = list(patterns[row, pool])
+    score = -1 if SOLVED_CODE in codes else 0
+    for code in set(codes):
+        if code != SOLVED_CODE:
+            score += brute_bucket_score(patterns, [col for col, c in zip(pool, codes) if c == code])
+    return score
+
+class Test_depth2_best_row(unittest.TestCase):
+    def runTest(self):
+        allowed = read_words("data/pl.allowed.txt")[:80]
+        possible = read_words("data/pl.possible.txt")[:40]
+        alphabet = sorted(set("".join(allowed + possible)))
+        patterns = precompute_patterns(encode_words(allowed + possible, alphabet), encode_words(possible, alphabet), len(alphabet))
+        order = np.arange(patterns.shape[0])
+        rng = Random(0)
+        for _ in range(8):
+            pool = np.array(sorted(rng.sample(range(len(possible)), rng.randint(3, 15))), dtype=np.int32)
+            pool_patterns = gather_pool(patterns, pool)
+            for row in rng.sample(range(patterns.shape[0]), 5):
+                codes = pool_patterns[row]
+                for code in set(codes):
+                    members = np.flatnonzero(codes == code)
+                    expected = brute_bucket_score(patterns, list(pool[members]))
+                    assert bucket_score(pool_patterns, order, members, NO_SCORE) == expected, "incorrect bucket score"
+            scores = [brute_depth2_score(patterns, list(pool), row) for row in range(patterns.shape[0])]
+            best_row = depth2_best_row(patterns, pool, order)
+            assert scores[best_row] == min(scores), "incorrect depth-2 guess"
+
+class Test_best_guess_row(unittest.TestCase):
+    def runTest(self):
+        allowed = read_words("data/pl.allowed.txt")
+        possible = read_words("data/pl.possible.txt")
+        alphabet = sorted(set("".join(allowed + possible)))
+        patterns = precompute_patterns(encode_words(allowed, alphabet), encode_words(possible, alphabet), len(alphabet))
+        order = np.arange(patterns.shape[0])
+        rng = Random(0)
+        for _ in range(10):
+            pool = np.array(sorted(rng.sample(range(len(possible)), rng.randint(25, len(possible)))), dtype=np.int32)
+            scores = [(np.bincount(patterns[row, pool]) ** 2).sum() for row in order]
+            expected = int(np.argmin(scores))
+            assert best_guess_row(patterns, pool, order) == expected, "incorrect pruned best guess"
+            assert best_guess_row_parallel(patterns, pool, order) == expected, "incorrect parallel best guess"
+
+class Test_disk_caches(unittest.TestCase):
+    def runTest(self):
+        answers = ["birch", "beech", "cedar", "ebony", "maple"]
+        agent_one = MyWordleAgent(answers, answers)
+        agent_one.cache[b"pool"] = "cedar"
+        assert MyWordleAgent(answers, answers).cache is agent_one.cache, "cache not shared"
+        agent.save_guess_caches()
+        assert agent.read_guess_cache(agent_one.cache_path)[b"pool"] == "cedar", "cache not reloaded"
+
+        agent.GUESS_CACHES[agent_one.cache_path] = {b"other": "maple"}
+        agent.save_guess_caches()
+        saved = agent.read_guess_cache(agent_one.cache_path)
+        assert saved[b"pool"] == "cedar" and saved[b"other"] == "maple", "saved caches not merged"
+
+        with open(agent_one.cache_path, "r+b") as writer:
+            writer.truncate(4)
+        assert agent.read_guess_cache(agent_one.cache_path) == dict(), "corrupted cache not treated as a miss"
+
+        patterns_path = os.path.join(agent.CACHE_DIR, f"{agent_one.key}.patterns.npy")
+        with open(patterns_path, "r+b") as writer:
+            writer.truncate(100)
+        agent_two = MyWordleAgent(answers, answers)
+        assert (agent_two.patterns == agent_one.patterns).all(), "corrupted pattern table not rebuilt"
+        assert (np.load(patterns_path) == agent_one.patterns).all(), "rebuilt pattern table not saved"
+
+class Test_saved_first_guess(unittest.TestCase):
+    def runTest(self):
+        answers = ["birch", "beech", "cedar", "ebony", "maple"]
+        first_guess = MyWordleAgent(answers, answers).first_guess()
+        reloaded = MyWordleAgent(answers, answers)
+        assert reloaded.guess == first_guess, "first guess not reloaded"
+
+        with open(reloaded.first_guess_path, "r+b") as writer:
+            writer.truncate(5)
+        assert reloaded.load_first_guess() is None, "corrupted first guess not treated as a miss"
 
 
-unittest.main()
\ No newline at end of file
+unittest.main() 